@@ -5,6 +5,12 @@ import os
 import dash
 from dash import html
 import dash_bootstrap_components as dbc
+import plotly.io as pio
+
+# Dash serializes every callback result (including our figures) through
+# Plotly's JSON encoder. orjson is several times faster than the standard
+# library encoder, especially for the NumPy arrays making up our traces.
+pio.json.config.default_engine = "orjson"
 
 logging.basicConfig(
     handlers=[
@@ -16,11 +22,19 @@ logging.basicConfig(
     datefmt="%Y-%m-%d %H:%M:%S",
 )
 
+# Numba logs its entire compilation pipeline at DEBUG level
+logging.getLogger("numba").setLevel(logging.WARNING)
+
 logger = logging.getLogger(__name__)
 
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], use_pages=True)
 server = app.server
 
+# Imported only once logging is set up, since importing it compiles the
+# simulation kernels and builds the initial graph.
+import global_state  # noqa: E402
+global_state.CACHE.init_app(server)
+
 def generate_container() -> html.Div:
     """
     Generate the main layout of the (effective) multipage app.
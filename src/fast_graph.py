@@ -0,0 +1,158 @@
+"""
+A compiled pipeline for building small Watts-Strogatz graphs.
+
+For the graph sizes used by the app, most of the time spent regenerating the
+global graph goes to NetworkX's Python-level graph construction and rewiring.
+`build_ws` instead performs the rewiring, connectivity check and layout on
+plain arrays, so a NetworkX graph only needs to be built once at the end.
+
+As with `layout_fast`, the kernels are cached on disk with `cache=True`, and
+are compiled at import so that a fresh process doesn't compile them on the
+first request.
+"""
+
+import numba
+import numpy as np
+import networkx as nx
+
+import layout_fast
+
+# Graphs with at least this many nodes are built with NetworkX instead, since
+# the rewiring here keeps a dense (n, n) adjacency matrix.
+MAX_NODES = 500
+
+
+@numba.njit(cache=True)
+def _ws_edges(n: int, k: int, p: float, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Generate the edges of a Watts-Strogatz graph, as `nx.watts_strogatz_graph`.
+
+    Returns an (m, 2) array of edges and the dense adjacency matrix.
+    """
+    np.random.seed(seed)
+
+    half = k // 2
+    edges = np.empty((n * half, 2), dtype=np.int32)
+    adj = np.zeros((n, n), dtype=np.bool_)
+    degree = np.zeros(n, dtype=np.int32)
+
+    # Connect each node to its k/2 neighbors on either side of the ring
+    for j in range(1, half + 1):
+        for u in range(n):
+            v = (u + j) % n
+            edges[(j - 1) * n + u, 0] = u
+            edges[(j - 1) * n + u, 1] = v
+            adj[u, v] = True
+            adj[v, u] = True
+            degree[u] += 1
+            degree[v] += 1
+
+    # Rewire each edge (u, v) to (u, w) with probability p, where w is chosen
+    # uniformly at random while avoiding self-loops and duplicate edges
+    for j in range(1, half + 1):
+        for u in range(n):
+            if np.random.random() >= p:
+                continue
+
+            v = (u + j) % n
+            w = np.random.randint(0, n)
+            rewire = True
+            while w == u or adj[u, w]:
+                w = np.random.randint(0, n)
+                if degree[u] >= n - 1:
+                    rewire = False
+                    break
+
+            if rewire:
+                adj[u, v] = False
+                adj[v, u] = False
+                degree[v] -= 1
+                adj[u, w] = True
+                adj[w, u] = True
+                degree[w] += 1
+                edges[(j - 1) * n + u, 1] = w
+
+    return edges, adj
+
+
+@numba.njit(cache=True)
+def _is_connected(adj: np.ndarray) -> bool:
+    """
+    Depth-first search over a dense adjacency matrix from node 0.
+    """
+    n = adj.shape[0]
+    seen = np.zeros(n, dtype=np.bool_)
+    stack = np.empty(n, dtype=np.int32)
+
+    seen[0] = True
+    stack[0] = 0
+    top = 1
+    count = 1
+    while top > 0:
+        top -= 1
+        u = stack[top]
+        for v in range(n):
+            if adj[u, v] and not seen[v]:
+                seen[v] = True
+                stack[top] = v
+                top += 1
+                count += 1
+
+    return count == n
+
+
+@numba.njit(cache=True)
+def _connected_ws_edges(n: int, k: int, p: float, seed: int) -> tuple[np.ndarray, int]:
+    """
+    Generate Watts-Strogatz graphs, bumping the seed until a connected graph
+    is found. Returns the edges and the seed that generated them.
+    """
+    while True:
+        edges, adj = _ws_edges(n, k, p, seed)
+        if _is_connected(adj):
+            return edges, seed
+        seed += 1
+
+
+def build_ws(
+    n: int, k: int, p: float, seed: int, layout: str = "spring"
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Build a connected Watts-Strogatz graph and lay it out.
+
+    :param n: The number of nodes.
+    :param k: Each node is joined with its `k` nearest neighbors in a ring.
+    :param p: The probability of rewiring each edge.
+    :param seed: The seed for the first attempt; if the resulting graph isn't
+        connected, the seed is incremented and the graph regenerated.
+    :param layout: Either "spring" (Fruchterman-Reingold) or "circular".
+    :return: An (m, 2) array of edges and an (n, 2) array of node positions.
+    """
+    if k > n:
+        raise nx.NetworkXError("k>n, choose smaller k or larger n")
+
+    if k == n:
+        edges = np.array(
+            [(u, v) for u in range(n) for v in range(u + 1, n)], dtype=np.int32
+        ).reshape(-1, 2)
+    else:
+        edges, seed = _connected_ws_edges(n, k, p, seed)
+
+    if layout == "circular":
+        return edges, layout_fast.circular_layout(n)
+
+    # Build the CSR adjacency for the layout directly from the edge list
+    rows = np.concatenate([edges[:, 0], edges[:, 1]])
+    cols = np.concatenate([edges[:, 1], edges[:, 0]])
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int32)
+    indptr[1:] = np.cumsum(np.bincount(rows, minlength=n))
+
+    positions = layout_fast.spring_layout_csr(indptr, cols[order], seed=seed)
+
+    return edges, positions
+
+
+# Compile the kernels now, on a tiny graph, rather than on the first graph
+# requested. The layout kernel is already compiled by `layout_fast`.
+build_ws(8, 2, 0.1, 0, "circular")
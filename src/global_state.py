@@ -8,10 +8,20 @@ the entire framework.
 import logging
 
 from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Optional
+from flask_caching import Cache
 import networkx as nx
+import numpy as np
 import plotly
+import plotly.graph_objects as go
+import scipy.sparse
+import scipy.sparse.csgraph
 
+import fast_graph
 import graph_utils
+import layout_fast
+import simul_utils
 
 logger = logging.getLogger(__name__)
 
@@ -21,8 +31,29 @@ class GraphParameters:
     k: int
     p: float
     
-    def to_ws_graph(self) -> nx.Graph:
-        return nx.watts_strogatz_graph(self.n, self.k, self.p)
+    # How nodes are positioned, either "circular" or "spring". WS graphs are
+    # rewired rings, so a circular layout shows them well at a fraction of the
+    # cost of a force-directed layout.
+    layout: str = "circular"
+    
+    # Picks between the graphs that can be generated from the same n, k and p.
+    # Changing it is how a user asks for a different graph.
+    seed: int = 0
+    
+    def graph_seed(self) -> int:
+        """
+        A seed derived from the parameters (including `seed`), so that the same
+        parameters always generate the same graph.
+        """
+        # Kept to 31 bits, since it's also passed to NumPy's legacy seeding in
+        # compiled code, and may be bumped if the graph isn't connected.
+        state = np.random.SeedSequence(
+            [self.n, self.k, round(self.p * 100), self.seed]
+        ).generate_state(1)[0]
+        return int(state >> 1)
+    
+    def to_ws_graph(self, seed: int | None = None) -> nx.Graph:
+        return nx.watts_strogatz_graph(self.n, self.k, self.p, seed=seed)
 
 # The parameters for the currently active graph.
 GRAPH_PARAMETERS: GraphParameters = None
@@ -30,28 +61,132 @@ GRAPH_PARAMETERS: GraphParameters = None
 # The active graph itself.
 GRAPH: nx.Graph = None
 
-# The current positions.
-POSITIONS = None
+# The current positions, as an (n, 2) array indexed by node.
+POSITIONS: Optional[np.ndarray] = None
+
+# The numbered edges and CSR adjacency of the active graph, as from
+# `simul_utils.edge_index`. These only depend on the graph, so they're built
+# once here rather than for every simulation.
+EDGE_INDEX: Optional[tuple[np.ndarray, scipy.sparse.csr_array]] = None
 
-# The active "base" figure.
-FIGURE: plotly.graph_objs.Figure = None
+# The active "base" figure, as a read-only snapshot of its serialized form.
+# There is deliberately no shared `go.Figure`; callbacks build their own with
+# `base_figure()` and are free to modify it.
+BASE_FIG_JSON: Optional[MappingProxyType] = None
 
-def update_global_state(n: int, k: int, p: float) -> plotly.graph_objs.Figure:
-    global GRAPH_PARAMETERS, GRAPH, FIGURE, POSITIONS
+# Previously generated graphs, keyed by (n, k, p, seed, layout). Since graphs are
+# seeded from their parameters, switching back to an earlier configuration can reuse the
+# graph, positions, edge index and figure generated for it. Only the
+# `GRAPH_CACHE_SIZE` most recently used configurations are kept.
+GRAPH_CACHE_SIZE = 16
+_GRAPH_CACHE: dict[tuple[int, int, float, int, str], tuple] = {}
+
+def update_global_state(n: int, k: int, p: float, layout: str = "circular", seed: int = 0) -> plotly.graph_objs.Figure:
+    global GRAPH_PARAMETERS, GRAPH, BASE_FIG_JSON, POSITIONS, EDGE_INDEX
+    
+    GRAPH_PARAMETERS = GraphParameters(n=n, k=k, p=p, layout=layout, seed=seed)
+    key = (n, k, p, seed, layout)
     
-    while True:
-        GRAPH_PARAMETERS = GraphParameters(n=n, k=k, p=p)
-        GRAPH = GRAPH_PARAMETERS.to_ws_graph()
-        POSITIONS = nx.spring_layout(GRAPH)
+    if key in _GRAPH_CACHE:
+        # Move the entry to the end, so that it's evicted last
+        _GRAPH_CACHE[key] = _GRAPH_CACHE.pop(key)
+        GRAPH, POSITIONS, EDGE_INDEX, BASE_FIG_JSON = _GRAPH_CACHE[key]
+        return base_figure()
+    
+    seed = GRAPH_PARAMETERS.graph_seed()
+    if n < fast_graph.MAX_NODES:
+        # Small graphs are generated and laid out on plain arrays; the NetworkX
+        # graph is only built once, from the final edge list.
+        edges, POSITIONS = fast_graph.build_ws(n, k, p, seed, layout)
+        GRAPH = nx.Graph()
+        GRAPH.add_nodes_from(range(n))
+        GRAPH.add_edges_from(edges.tolist())
+    else:
+        # Only lay out the graph once a connected graph has been found, since
+        # the layout is by far the most expensive step. Bump the seed on each
+        # retry so that we don't regenerate the same disconnected graph forever.
+        #
+        # The connectivity check runs on a sparse adjacency matrix in compiled
+        # code, rather than as a Python-level BFS over the graph's dicts.
+        while True:
+            GRAPH = GRAPH_PARAMETERS.to_ws_graph(seed)
+            adj = nx.to_scipy_sparse_array(GRAPH)
+            n_components, _ = scipy.sparse.csgraph.connected_components(adj, directed=False)
+            
+            if n_components > 1:
+                logger.info("Need to regenerate graph, not connected")
+                seed += 1
+                continue
+            else:
+                break
         
-        if not nx.is_connected(GRAPH):
-            logger.info("Need to regenerate graph, not connected")
-            continue
+        if layout == "circular":
+            POSITIONS = layout_fast.circular_layout(n)
         else:
-            break
-        
-    FIGURE = graph_utils.create_figure_from_graph(GRAPH, POSITIONS)
+            positions = layout_fast.spring_layout(GRAPH, seed=seed)
+            POSITIONS = np.ascontiguousarray(
+                [positions[i] for i in range(len(positions))], dtype=np.float64
+            )
+    
+    EDGE_INDEX = simul_utils.edge_index(GRAPH)
+    BASE_FIG_JSON = MappingProxyType(
+        graph_utils.create_figure_from_graph(GRAPH, POSITIONS).to_plotly_json()
+    )
+    
+    # Evict the least recently used entry (dicts preserve insertion order, and
+    # hits are moved to the end)
+    if len(_GRAPH_CACHE) >= GRAPH_CACHE_SIZE:
+        del _GRAPH_CACHE[next(iter(_GRAPH_CACHE))]
+    _GRAPH_CACHE[key] = (GRAPH, POSITIONS, EDGE_INDEX, BASE_FIG_JSON)
+    
+    return base_figure()
+
+def base_figure() -> plotly.graph_objs.Figure:
+    """
+    Build a fresh, modifiable copy of the active base figure.
+    
+    The snapshot was generated from a valid figure, so this skips Plotly's
+    validation of every property when building the copy, which is by far the
+    most expensive part of constructing a figure. (`skip_invalid=True` only
+    ignores validation errors; it still validates.)
+    """
+    assert BASE_FIG_JSON is not None, "update_global_state() hasn't been called"
+    return go.Figure(dict(BASE_FIG_JSON), _validate=False)
+
+# Results shared across callbacks, attached to the Flask server in `app.py`.
+# Entries never go stale, since they're keyed on everything they depend on.
+CACHE = Cache(config={"CACHE_TYPE": "SimpleCache", "CACHE_DEFAULT_TIMEOUT": 0})
+
+@CACHE.memoize()
+def _attack_paths(
+    n: int,
+    k: int,
+    p: float,
+    seed: int,
+    target_node: int,
+    attacking_nodes: tuple[int, ...],
+) -> simul_utils.AttackPaths:
+    # The graph parameters aren't used directly, but make up part of the cache
+    # key; since graphs are seeded from their parameters, they identify GRAPH.
+    return simul_utils.shortest_paths(
+        GRAPH, target_node, list(attacking_nodes), index=EDGE_INDEX
+    )
+
+def attack_paths(target_node: int, attacking_nodes: list[int]) -> simul_utils.AttackPaths:
+    """
+    The shortest paths from each attacker to the target on the active graph.
     
-    return FIGURE
+    These only depend on the graph, target and attackers, so they're cached
+    across callbacks; changing only the number of packets or the marking
+    probability doesn't search the graph again.
+    """
+    return _attack_paths(
+        GRAPH_PARAMETERS.n,
+        GRAPH_PARAMETERS.k,
+        GRAPH_PARAMETERS.p,
+        GRAPH_PARAMETERS.seed,
+        target_node,
+        tuple(sorted(attacking_nodes)),
+    )
 
 update_global_state(20, 2, 0.75)
\ No newline at end of file
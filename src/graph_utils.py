@@ -2,11 +2,10 @@
 Various shared routines for generating graphs.
 """
 
-import copy
-
-from typing import Callable, Tuple
+from typing import Callable, Optional, Sequence, Tuple
 import plotly.graph_objects as go
 import networkx as nx
+import numpy as np
 import plotly
 
 DEFAULT_FIGURE_LAYOUT = go.Layout(
@@ -18,10 +17,62 @@ DEFAULT_FIGURE_LAYOUT = go.Layout(
     height=800,
 )
 
+# The index of the node trace in `fig.data` for figures generated by
+# `create_figure_from_graph`. The node trace is always drawn after (on top of)
+# the edge trace.
+NODE_TRACE_INDEX = 1
+
+# The index of the edge trace in `fig.data`, as with `NODE_TRACE_INDEX`.
+EDGE_TRACE_INDEX = 0
+
+# The browser-side equivalent of `color_nodes_by_property`, for use with
+# `dash.clientside_callback`. It takes `{"property": ..., "values": [...]}`
+# (usually from a `dcc.Store`) and the current figure, and returns a copy of the
+# figure with the node trace recolored. This lets callbacks send just the
+# values rather than a whole figure.
+COLOR_NODES_BY_PROPERTY_JS = """
+function(colors, figure) {
+    if (!colors || !figure) {
+        return window.dash_clientside.no_update;
+    }
+    const data = figure.data.slice();
+    const node_trace = Object.assign({}, data[%d]);
+    node_trace.marker = Object.assign({}, node_trace.marker, {
+        color: colors.values,
+        showscale: true,
+        colorbar: {title: colors.property, thickness: 15, xanchor: "left"},
+    });
+    node_trace.hovertemplate = colors.property + "=%%{marker.color}";
+    data[%d] = node_trace;
+    return Object.assign({}, figure, {data: data});
+}
+""" % (NODE_TRACE_INDEX, NODE_TRACE_INDEX)
+
+
+def edge_coordinates(positions: np.ndarray, edges: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the x and y coordinates for drawing `edges` as a single line trace.
+    
+    Each edge becomes a (start, end, NaN) triple; the NaN breaks the line so
+    that consecutive edges aren't joined together.
+    
+    Coordinates are returned as float32, which halves the size of the figure
+    sent to the browser with no visible difference at screen resolution.
+    
+    :param positions: An (n, 2) array of node positions.
+    :param edges: An (m, 2) array of node indices.
+    """
+    edges = np.asarray(edges, dtype=np.int32).reshape(-1, 2)
+    edge_xy = np.empty((3 * len(edges), 2), dtype=np.float32)
+    edge_xy[0::3] = positions[edges[:, 0]]
+    edge_xy[1::3] = positions[edges[:, 1]]
+    edge_xy[2::3] = np.nan
+    return edge_xy[:, 0], edge_xy[:, 1]
+
 
 def create_figure_from_graph(
     graph: nx.Graph,
-    positions = None,
+    positions: Optional[np.ndarray | dict[int, tuple[float, float]]] = None,
     layout: Callable[..., dict[int, tuple[float, float]]] = nx.spring_layout,
     figure_layout: go.Layout = DEFAULT_FIGURE_LAYOUT,
 ) -> plotly.graph_objs.Figure:
@@ -34,24 +85,25 @@ def create_figure_from_graph(
     #
     # For pretty much every other graph, we have to do the positioning of nodes
     # ourselves. In turn, we use a layout callable.
-    if not positions:
+    if positions is None:
         positions = layout(graph)
 
-    # Create edge listing
-    edge_x = []
-    edge_y = []
-    for node_idx_1, node_idx_2 in graph.edges():
-        x0, y0 = positions[node_idx_1]
-        x1, y1 = positions[node_idx_2]
-        edge_x.append(x0)
-        edge_x.append(x1)
-        edge_x.append(None)
-        edge_y.append(y0)
-        edge_y.append(y1)
-        edge_y.append(None)
+    # Gather the node positions into an (n, 2) array (if they aren't already),
+    # so that the edge listing can be built with fancy indexing rather than
+    # per-edge Python appends.
+    if isinstance(positions, dict):
+        pos_arr = np.array([positions[i] for i in range(graph.number_of_nodes())])
+    else:
+        pos_arr = np.asarray(positions)
+    edges_arr = np.fromiter(
+        (i for e in graph.edges() for i in e), dtype=np.int32
+    ).reshape(-1, 2)
+
+    # Create edge listing.
+    edge_x, edge_y = edge_coordinates(pos_arr, edges_arr)
 
     # Generate a scatter plot composed of only the edges.
-    edge_trace = go.Scatter(
+    edge_trace = go.Scattergl(
         name="edge_trace",
         x=edge_x,
         y=edge_y,
@@ -60,16 +112,13 @@ def create_figure_from_graph(
         mode="lines",
     )
 
-    # Get the absolute positions of all nodes from the layout.
-    node_x = []
-    node_y = []
-    for node in graph.nodes():
-        x, y = positions[node]
-        node_x.append(x)
-        node_y.append(y)
+    # Get the absolute positions of all nodes from the layout. As with the
+    # edges, these are sent to the browser as float32.
+    node_x = pos_arr[:, 0].astype(np.float32)
+    node_y = pos_arr[:, 1].astype(np.float32)
 
     # Generate a scatter plot from the nodes.
-    node_trace = go.Scatter(
+    node_trace = go.Scattergl(
         name="node_trace",
         texttemplate="%{customdata}",
         textposition='top center',
@@ -96,163 +145,149 @@ def create_figure_from_graph(
     )
 
     # Create the actual graph object. Overlay the node and the edge figure
-    # on top of each other to form a single network graph.
+    # on top of each other to form a single network graph. If this order
+    # changes, update NODE_TRACE_INDEX and EDGE_TRACE_INDEX.
     fig = go.Figure(data=[edge_trace, node_trace], layout=figure_layout)
 
     return fig
 
 def color_nodes_by_role(
-    graph: nx.Graph,
     fig: plotly.graph_objs.Figure,
     victim_node: int,
     attacker_nodes: list[int],
+    times_used: Sequence[int],
 ) -> plotly.graph_objs.Figure:
     """
     Recolor the "reconstructed" graph from a node appending algorithm graph.
     
-    :param graph: The marked graph passed through `simul_utils.simulate_transmissions()`.
     :param fig: The figure to update.
     :param victim_node: The victim node. Marked blue.
     :param attacker_nodes: The attacker nodes. Marked red.
+    :param times_used: The number of times each node was used, from
+        `SimulationResult.times_used`.
     """
     # Color and label nodes based on the number of adjacencies that they have.
     # The actual color is decided automatically based on the value of each node
     # passed through node_trace.marker.color; the color scheme is also predefined
     # in create_graph.
-    node_values = []
-    node_text = []
-    for node in graph.nodes():
-        node_value = ""
-        node_label = ""
-        
-        if node == victim_node:
-            node_value = "blue"
-            node_label = "Victim"
-        elif node in attacker_nodes:
-            node_value = "red"
-            node_label = "Attacker"
-        elif graph.nodes[node]["times_used"] == 0:
-            node_value = "gray"
-            node_label = "Unused router"
-        else:
-            node_value = "white"
-            node_label = f"Router (used {graph.nodes[node]['times_used']} times)"
-        
-        node_values.append(node_value)
-        node_text.append(node_label)
-
-    # Update the node component of the graph by name
-    # https://community.plotly.com/t/need-to-target-a-specific-trace-by-name-when-use-update-traces-s-selector/63151
     #
-    # This code is equivalent to the original, where the traces are accessed directly:
-    #   node_trace.marker.color = node_adjacencies
-    #   node_trace.text = node_text
-    fig.update_traces(
-        {
-            "text": node_text,
-            "marker": {
-                "color": node_values,
-                "showscale": False,
-            },
-            "hovertemplate": f"%{{text}}",
-        },
-        selector = {'name':'node_trace'}
-    )
+    # Every node starts out as a router, colored by whether it was used at all;
+    # the attackers and the victim are then overridden by index.
+    counts = np.asarray(times_used)
+    node_values = np.where(counts == 0, "gray", "white").tolist()
+    node_text = [
+        f"Router (used {used} times)" if used else "Unused router"
+        for used in counts.tolist()
+    ]
+    
+    for node in attacker_nodes:
+        node_values[node] = "red"
+        node_text[node] = "Attacker"
+    
+    node_values[victim_node] = "blue"
+    node_text[victim_node] = "Victim"
+
+    # Update the node component of the graph directly by index. This is
+    # equivalent to `fig.update_traces(..., selector={'name': 'node_trace'})`,
+    # but skips searching through (and validating against) every trace.
+    node_trace = fig.data[NODE_TRACE_INDEX]
+    node_trace.text = node_text
+    node_trace.marker.color = node_values
+    node_trace.marker.showscale = False
+    node_trace.hovertemplate = "%{text}"
     
     return fig 
 
-def color_nodes_by_property(graph: nx.Graph, fig: plotly.graph_objs.Figure, property: str) -> plotly.graph_objs.Figure:
+def color_nodes_by_property(fig: plotly.graph_objs.Figure, property: str, values: Sequence[int]) -> plotly.graph_objs.Figure:
     """
     Color nodes on a figure generated by `create_figure_from_graph` based on the
-    number of nodes that are adjacent to it.
+    value of a property of each node.
     
-    The graph represented by `fig` and `graph` itself must be identical.
+    :param property: The name of the property, used to label the nodes.
+    :param values: The value of the property for each node, indexed by node
+        (e.g. `SimulationResult.times_used`).
     """
     # Color and label nodes based on the number of adjacencies that they have.
     # The actual color is decided automatically based on the value of each node
     # passed through node_trace.marker.color; the color scheme is also predefined
     # in create_graph.
-    node_values = []
-    node_text = []
-    for node in graph.nodes():
-        val = graph.nodes[node][property]
-        
-        node_values.append(val)
-        node_text.append(f"{property}={val}")
-
-
-    # Update the node component of the graph by name
-    # https://community.plotly.com/t/need-to-target-a-specific-trace-by-name-when-use-update-traces-s-selector/63151
     #
-    # This code is equivalent to the original, where the traces are accessed directly:
-    #   node_trace.marker.color = node_adjacencies
-    #   node_trace.text = node_text
-    fig.update_traces(
-        {
-            "text": node_text,
-            "marker": {
-                "color": node_values,
-                "showscale": True,
-                "colorbar": {
-                    "title": property,
-                    "thickness":15,
-                    "xanchor":"left",
-                    # "titleside":"right",
-                }
-            },
-            "hovertemplate": f"%{{text}}",
-        },
-        selector = {'name':'node_trace'}
-    )
+    # The hover label is generated by Plotly from the color values themselves,
+    # so there's no need to build a label for every node here.
+    node_values = list(values)
+
+    # Update the node component of the graph directly by index; see
+    # `color_nodes_by_role`.
+    node_trace = fig.data[NODE_TRACE_INDEX]
+    node_trace.marker.color = node_values
+    node_trace.marker.showscale = True
+    node_trace.marker.colorbar = {
+        "title": property,
+        "thickness": 15,
+        "xanchor": "left",
+        # "titleside":"right",
+    }
+    node_trace.hovertemplate = f"{property}=%{{marker.color}}"
     
     return fig
     
-def color_nodes_by_adjacency(graph: nx.Graph, fig: plotly.graph_objs.Figure) -> plotly.graph_objs.Figure:
+def color_nodes_by_adjacency(graph: nx.Graph, fig: plotly.graph_objs.Figure, degrees: Optional[Sequence[int]] = None) -> plotly.graph_objs.Figure:
     """
     Color nodes on a figure generated by `create_figure_from_graph` based on the
     number of nodes that are adjacent to it.
     
     The graph represented by `fig` and `graph` itself must be identical.
+    
+    :param degrees: The degree of each node, indexed by node. If not given,
+        the degrees are read from `graph`.
     """
     
     # Color and label nodes based on the number of adjacencies that they have.
     # The actual color is decided automatically based on the value of each node
     # passed through node_trace.marker.color; the color scheme is also predefined
     # in create_graph.
-    node_adjacencies = []
-    node_text = []
-    for node, adjacencies in enumerate(graph.adjacency()):
-        node_adjacencies.append(len(adjacencies[1]))
-        node_text.append(f"Connections: {len(adjacencies[1])}")
+    #
+    # The hover label is generated by Plotly from the color values themselves,
+    # so there's no need to build a label for every node here.
+    if degrees is None:
+        node_adjacencies = [d for _, d in graph.degree()]
+    else:
+        node_adjacencies = list(degrees)
 
+    # Update the node component of the graph directly by index; see
+    # `color_nodes_by_role`.
+    node_trace = fig.data[NODE_TRACE_INDEX]
+    node_trace.textposition = 'top center'
+    node_trace.marker.color = node_adjacencies
+    node_trace.marker.showscale = True
+    node_trace.marker.colorbar = {
+        "title": "Number of connections",
+        "thickness": 15,
+        "xanchor": "left",
+        # "titleside":"right",
+    }
+    node_trace.hovertemplate = "Connections: %{marker.color}"
+    
+    return fig
 
-    # Update the node component of the graph by name
-    # https://community.plotly.com/t/need-to-target-a-specific-trace-by-name-when-use-update-traces-s-selector/63151
-    #
-    # This code is equivalent to the original, where the traces are accessed directly:
-    #   node_trace.marker.color = node_adjacencies
-    #   node_trace.text = node_text
-    fig.update_traces(
-        {
-            "text": node_text,
-            "textposition": 'top center',
-            "marker": {
-                "color": node_adjacencies,
-                "showscale": True,
-                "colorbar": {
-                    "title": "Number of connections",
-                    "thickness": 15,
-                    "xanchor":"left",
-                    # "titleside":"right",
-                }
-            }
-        },
-        selector = {'name':'node_trace'}
-    )
+def _replace_edge_trace(fig: plotly.graph_objs.Figure, name: str, edge_x: np.ndarray, edge_y: np.ndarray) -> plotly.graph_objs.Figure:
+    """
+    Replace the edges drawn by the edge trace of `fig` with the given
+    coordinates, and rename the trace to `name`.
+    
+    The trace is updated in place, so only the new coordinates are validated
+    rather than every trace of a new figure. `fig` must be a private copy
+    (e.g. from `global_state.base_figure()`). The line style of the original
+    edges is kept, and the new edges are still drawn under the nodes.
+    """
+    edge_trace = fig.data[EDGE_TRACE_INDEX]
+    edge_trace.name = name
+    edge_trace.x = edge_x
+    edge_trace.y = edge_y
     
     return fig
 
-def rebuild_node_append_paths(graph: nx.Graph, fig: plotly.graph_objs.Figure, victim_node: int, positions: list[Tuple[float, float]]) -> plotly.graph_objs.Figure:
+def rebuild_node_append_paths(graph: nx.Graph, fig: plotly.graph_objs.Figure, victim_node: int, positions: np.ndarray, times_used: Sequence[int], edge_times_used: np.ndarray, edges: np.ndarray) -> plotly.graph_objs.Figure:
     """
     Perform path reconstruction according to the node sampling algorithm.
     
@@ -260,165 +295,65 @@ def rebuild_node_append_paths(graph: nx.Graph, fig: plotly.graph_objs.Figure, vi
     of how things actually work.
     
     You should call this after coloring the nodes.
-    """
-    # Copy the figure
-    fig_2 = copy.deepcopy(fig)
-    
-    # First, destroy the edges currently present in the figure by outright
-    # removing the edge traces on the original figure (more accurately,
-    # hiding them since this apparently isn't really all that easy)
-    for i, trace in enumerate(fig.data):
-        if 'name' in trace and trace['name'] == 'edge_trace':
-            fig_2.data[i].visible = False
     
+    :param times_used: `SimulationResult.times_used` for the simulation.
+    :param edge_times_used: `SimulationResult.edge_times_used` for the simulation.
+    :param edges: `SimulationResult.edges` for the simulation.
+    """
     # Perform a simple reconstruction of the edges; also check for any neighbors
     # with nonzero use times
-    edge_x = []
-    edge_y = []
-    for a, b in graph.edges():
-        if graph.edges[a, b]['times_used'] != 0:
-            x0, y0 = positions[a]
-            x1, y1 = positions[b]
-            edge_x.append(x0)
-            edge_x.append(x1)
-            edge_x.append(None)
-            edge_y.append(y0)
-            edge_y.append(y1)
-            edge_y.append(None)
-            
-    for node in graph.neighbors(victim_node):
-        if graph.nodes[node]["times_used"] != 0:
-            x0, y0 = positions[victim_node]
-            x1, y1 = positions[node]
-            edge_x.append(x0)
-            edge_x.append(x1)
-            edge_x.append(None)
-            edge_y.append(y0)
-            edge_y.append(y1)
-            edge_y.append(None)
+    neighbors = np.fromiter(graph.neighbors(victim_node), dtype=np.int64)
+    neighbors = neighbors[np.asarray(times_used)[neighbors] != 0]
+    used = np.concatenate([
+        edges[np.asarray(edge_times_used) != 0],
+        np.column_stack([np.full(len(neighbors), victim_node), neighbors]),
+    ])
+    edge_x, edge_y = edge_coordinates(positions, used)
 
-    # Generate a scatter plot composed of only the edges.
-    edge_trace = go.Scatter(
-        name="node_append_edge_trace",
-        x=edge_x,
-        y=edge_y,
-        line=dict(width=0.5, color="#888"),
-        hoverinfo="none",
-        mode="lines",
-    )
-    
-    # Add the new trace to the figure
-    fig_2.add_trace(edge_trace)
-    
-    # Return
-    return fig_2
+    # Swap the new edges in for the original edges
+    return _replace_edge_trace(fig, "node_append_edge_trace", edge_x, edge_y)
 
-def rebuild_node_sampling_paths(graph: nx.Graph, fig: plotly.graph_objs.Figure, victim_node: int, positions: list[Tuple[float, float]]) -> plotly.graph_objs.Figure:
+def rebuild_node_sampling_paths(fig: plotly.graph_objs.Figure, victim_node: int, positions: np.ndarray, times_marked: Sequence[int]) -> plotly.graph_objs.Figure:
     """
     Perform path reconstruction according to the node append algorithm.
     
     You should call this after coloring the nodes.
-    """
-    # Copy the figure
-    fig_2 = copy.deepcopy(fig)
-    
-    # First, destroy the edges currently present in the figure by outright
-    # removing the edge traces on the original figure (more accurately,
-    # hiding them since this apparently isn't really all that easy)
-    for i, trace in enumerate(fig.data):
-        if 'name' in trace and trace['name'] == 'edge_trace':
-            fig_2.data[i].visible = False
     
-    # Now perform the path reconstruction exactly as stated by the paper
-    counts = {}
-    for node in graph.nodes():
-        # print(f"{node=}, {graph.nodes[node]['times_marked']=}")
-        if graph.nodes[node]['times_marked'] != 0:
-            counts[node] = graph.nodes[node]['times_marked']
-    counts = {k: v for k, v in sorted(counts.items(), key=lambda item: item[1])}
+    :param times_marked: `SimulationResult.times_marked` for the simulation.
+    """
+    # Now perform the path reconstruction exactly as stated by the paper: order
+    # the marked nodes from least to most marked (ties by node index)
+    counts = np.asarray(times_marked)
+    marked = np.flatnonzero(counts)
+    marked = marked[np.argsort(counts[marked], kind="stable")]
     
-    # Draw edges according to the order of keys (node indices) in `counts`, 
-    # including one edge to the victim node from the most frequent node
-    ordered_nodes = list(counts.keys()) + [victim_node]
-    edge_x = []
-    edge_y = []
-    for i in range(len(ordered_nodes)-1):
-        a = ordered_nodes[i]
-        b = ordered_nodes[i+1]
-        
-        # print(f"{a=}, {b=}")
-        
-        x0, y0 = positions[a]
-        x1, y1 = positions[b]
-        edge_x.append(x0)
-        edge_x.append(x1)
-        edge_x.append(None)
-        edge_y.append(y0)
-        edge_y.append(y1)
-        edge_y.append(None)
-        
-    # Generate a scatter plot composed of only the edges.
-    edge_trace = go.Scatter(
-        name="node_appending_edge_trace",
-        x=edge_x,
-        y=edge_y,
-        line=dict(width=0.5, color="#888"),
-        hoverinfo="none",
-        mode="lines",
+    # Draw edges between consecutive nodes in that order, including one edge to
+    # the victim node from the most frequent node
+    ordered_nodes = np.append(marked, victim_node)
+    edge_x, edge_y = edge_coordinates(
+        positions, np.column_stack([ordered_nodes[:-1], ordered_nodes[1:]])
     )
-    
-    # Add the new trace to the figure
-    fig_2.add_trace(edge_trace)
-    
-    # Return
-    return fig_2
+        
+    # Swap the new edges in for the original edges
+    return _replace_edge_trace(fig, "node_appending_edge_trace", edge_x, edge_y)
 
-def rebuild_edge_sampling_paths(graph: nx.Graph, fig: plotly.graph_objs.Figure, victim_node: int, positions: list[Tuple[float, float]]) -> plotly.graph_objs.Figure:
+def rebuild_edge_sampling_paths(fig: plotly.graph_objs.Figure, positions: np.ndarray, edge_times_marked: np.ndarray, edges: np.ndarray) -> plotly.graph_objs.Figure:
     """
     Perform path reconstruction according to the node sampling algorithm.
     
     You should call this after coloring the nodes.
-    """
-    # Copy the figure
-    fig_2 = copy.deepcopy(fig)
-    
-    # First, destroy the edges currently present in the figure by outright
-    # removing the edge traces on the original figure (more accurately,
-    # hiding them since this apparently isn't really all that easy)
-    for i, trace in enumerate(fig.data):
-        if 'name' in trace and trace['name'] == 'edge_trace':
-            fig_2.data[i].visible = False
     
+    :param edge_times_marked: `SimulationResult.edge_times_marked` for the
+        simulation.
+    :param edges: `SimulationResult.edges` for the simulation.
+    """
     # Now perform the path reconstruction. Because our graphs are inherently
     # acyclic (since the shortest path calculation will be deterministic for
     # any two points in the graph, since the graph doesn't change halfway),
     # there is no need to remove edges of incorrect distance or assert acylic
     # cycles.
-    edge_x = []
-    edge_y = []
-    for a, b in graph.edges():
-        if graph.edges[a, b]['times_marked'] != 0:
-            x0, y0 = positions[a]
-            x1, y1 = positions[b]
-            edge_x.append(x0)
-            edge_x.append(x1)
-            edge_x.append(None)
-            edge_y.append(y0)
-            edge_y.append(y1)
-            edge_y.append(None)
+    marked = edges[np.asarray(edge_times_marked) != 0]
+    edge_x, edge_y = edge_coordinates(positions, marked)
         
-    # Generate a scatter plot composed of only the edges.
-    edge_trace = go.Scatter(
-        name="edge_sampling_edge_trace",
-        x=edge_x,
-        y=edge_y,
-        line=dict(width=0.5, color="#888"),
-        hoverinfo="none",
-        mode="lines",
-    )
-    
-    # Add the new trace to the figure
-    fig_2.add_trace(edge_trace)
-    
-    # Return
-    return fig_2
+    # Swap the new edges in for the original edges
+    return _replace_edge_trace(fig, "edge_sampling_edge_trace", edge_x, edge_y)
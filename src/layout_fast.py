@@ -0,0 +1,165 @@
+"""
+JIT-compiled graph layouts.
+
+NetworkX's `spring_layout` is pure Python/NumPy and dominates the time taken
+to regenerate the global graph. The routines here implement the same
+Fruchterman-Reingold algorithm as a Numba kernel over a CSR adjacency.
+
+Kernels are compiled with `cache=True`, which stores the compiled code in the
+`__pycache__` directory next to this file (or in `NUMBA_CACHE_DIR`, if set).
+If that directory isn't writable, or isn't kept between deploys, each new
+process compiles the kernels from scratch, which takes several seconds; they're
+compiled at import (see the end of this module) so that this doesn't land on
+the first request.
+"""
+
+import numba
+import numpy as np
+import networkx as nx
+
+
+@numba.njit(parallel=True, fastmath=True, cache=True)
+def fr_layout(
+    pos: np.ndarray,
+    adj_indptr: np.ndarray,
+    adj_indices: np.ndarray,
+    iters: int,
+    k: np.float32,
+) -> np.ndarray:
+    """
+    Run the Fruchterman-Reingold force-directed algorithm in place on `pos`.
+
+    This mirrors `nx.drawing.layout._fruchterman_reingold`: every pair of
+    nodes repels with force k^2/d, every edge attracts with force d^2/k, and
+    the maximum step size is linearly cooled over `iters` iterations.
+
+    :param pos: An (n, 2) array of initial positions. Modified in place.
+    :param adj_indptr: The `indptr` array of the graph's CSR adjacency.
+    :param adj_indices: The `indices` array of the graph's CSR adjacency.
+    :param iters: The maximum number of iterations to run.
+    :param k: The optimal distance between nodes.
+    """
+    n = pos.shape[0]
+    threshold = 1e-4
+    displacement = np.zeros_like(pos)
+
+    # The initial "temperature" is about 0.1 of the domain; this is the largest
+    # step allowed in the dynamics.
+    t = max(
+        pos[:, 0].max() - pos[:, 0].min(),
+        pos[:, 1].max() - pos[:, 1].min(),
+    ) * 0.1
+    dt = t / (iters + 1)
+
+    for _ in range(iters):
+        for i in numba.prange(n):
+            dx = 0.0
+            dy = 0.0
+
+            # Repulsive force between all pairs of nodes
+            for j in range(n):
+                ddx = pos[i, 0] - pos[j, 0]
+                ddy = pos[i, 1] - pos[j, 1]
+                dist = max(np.sqrt(ddx * ddx + ddy * ddy), 0.01)
+                f = k * k / (dist * dist)
+                dx += ddx * f
+                dy += ddy * f
+
+            # Attractive force along each edge
+            for idx in range(adj_indptr[i], adj_indptr[i + 1]):
+                j = adj_indices[idx]
+                ddx = pos[i, 0] - pos[j, 0]
+                ddy = pos[i, 1] - pos[j, 1]
+                dist = max(np.sqrt(ddx * ddx + ddy * ddy), 0.01)
+                f = dist / k
+                dx -= ddx * f
+                dy -= ddy * f
+
+            displacement[i, 0] = dx
+            displacement[i, 1] = dy
+
+        # Limit each step to the current temperature, then cool
+        moved = 0.0
+        for i in range(n):
+            length = np.sqrt(
+                displacement[i, 0] * displacement[i, 0]
+                + displacement[i, 1] * displacement[i, 1]
+            )
+            scale = t / max(length, 0.01)
+            pos[i, 0] += displacement[i, 0] * scale
+            pos[i, 1] += displacement[i, 1] * scale
+            moved += (displacement[i, 0] * scale) ** 2 + (displacement[i, 1] * scale) ** 2
+
+        t -= dt
+        if np.sqrt(moved) / n < threshold:
+            break
+
+    return pos
+
+
+def circular_layout(n: int) -> np.ndarray:
+    """
+    Place `n` nodes evenly around the unit circle, returning an (n, 2) array of
+    positions.
+
+    Equivalent to `nx.circular_layout`, but computed in closed form.
+    """
+    theta = 2 * np.pi * np.arange(n) / n
+    return np.column_stack([np.cos(theta), np.sin(theta)])
+
+
+def spring_layout_csr(
+    adj_indptr: np.ndarray,
+    adj_indices: np.ndarray,
+    iterations: int = 50,
+    seed: int | None = None,
+) -> np.ndarray:
+    """
+    Lay out a graph given as a CSR adjacency, returning an (n, 2) array of
+    positions.
+
+    Positions are rescaled to [-1, 1] and centered on the origin, as with
+    NetworkX.
+    """
+    n = len(adj_indptr) - 1
+    rng = np.random.default_rng(seed)
+    pos = rng.random((n, 2), dtype=np.float32)
+
+    pos = fr_layout(
+        pos,
+        adj_indptr.astype(np.int32),
+        adj_indices.astype(np.int32),
+        iterations,
+        np.float32(np.sqrt(1.0 / n)),
+    )
+
+    # Rescale to (-1, 1), preserving aspect ratio
+    pos = pos.astype(np.float64)
+    pos -= pos.mean(axis=0)
+    lim = np.abs(pos).max()
+    if lim > 0:
+        pos /= lim
+
+    return pos
+
+
+def spring_layout(
+    graph: nx.Graph, iterations: int = 50, seed: int | None = None
+) -> dict[int, tuple[float, float]]:
+    """
+    Drop-in replacement for `nx.spring_layout` backed by `fr_layout`.
+    """
+    n = graph.number_of_nodes()
+    if n == 0:
+        return {}
+
+    adj = nx.to_scipy_sparse_array(graph, nodelist=range(n), format="csr")
+    pos = spring_layout_csr(adj.indptr, adj.indices, iterations, seed)
+
+    return {i: (float(pos[i, 0]), float(pos[i, 1])) for i in range(n)}
+
+
+# Compile `fr_layout` now, on a two-node graph, rather than on the first spring
+# layout requested. The arguments have the same types as in real calls, so the
+# compiled code is reused.
+spring_layout_csr(np.array([0, 1, 2]), np.array([1, 0]), iterations=1, seed=0)
@@ -0,0 +1,237 @@
+"""
+Shared layout and callbacks for the simulation pages.
+
+Every simulation page has the same structure: a base graph colored by the
+number of times each node was used, a graph of the reconstructed paths, the
+simulation options and the results. Only the reconstruction and the results
+differ between pages, so each page module just supplies those to
+`register_page`.
+"""
+
+from typing import Callable, Optional, Tuple, Union
+import functools
+
+from dash import html, Input, Output, State, callback, ctx, dcc
+import dash
+import dash_bootstrap_components as dbc
+import plotly
+
+import graph_utils
+import simul_utils
+import global_state
+
+# Builds the reconstructed path figure and the results for a simulation, given
+# a fresh copy of the base figure to draw on, the simulation result, the victim
+# node and the attacker nodes.
+Renderer = Callable[
+    [plotly.graph_objs.Figure, simul_utils.SimulationResult, int, list[int]],
+    Tuple[plotly.graph_objs.Figure, list],
+]
+
+def generate_options(prefix: str, default_p: Optional[float]) -> dbc.Form:
+    # The form only depends on the number of nodes in the active graph, so it's
+    # only rebuilt when that changes rather than on every page load.
+    return _build_options(prefix, default_p, global_state.GRAPH_PARAMETERS.n)
+
+@functools.lru_cache(maxsize=8)
+def _attacker_options(n: int) -> list[dict]:
+    # Shared by every page's form, so each graph size only builds the list once.
+    return [{"label": str(i), "value": i} for i in range(n)]
+
+@functools.lru_cache(maxsize=32)
+def _build_options(prefix: str, default_p: Optional[float], n: int) -> dbc.Form:
+    options = [
+        dbc.Label("Packets to send", html_for=f"slider-{prefix}-packets"),
+        dcc.Slider(0, 5000, 10, value=100, id=f'slider-{prefix}-packets', marks=None, tooltip={"placement": "bottom", "always_visible": True}),
+        dbc.Label("Index of victim node", html_for=f"slider-{prefix}-victim"),
+        dcc.Slider(0, n-1, 1, value=0, id=f'slider-{prefix}-victim', marks=None, tooltip={"placement": "bottom", "always_visible": True}),
+        dbc.Label("Indices of attackers", html_for=f"dropdown-{prefix}-attackers"),
+        dcc.Dropdown(
+        _attacker_options(n),
+        [1],
+        multi=True,
+        id=f"dropdown-{prefix}-attackers"
+        ),
+    ]
+
+    if default_p is not None:
+        options += [
+            dbc.Label("Marking probability (p)", html_for=f"slider-{prefix}-p"),
+            dcc.Slider(0, 1, 0.01, value=default_p, id=f'slider-{prefix}-p', marks=None, tooltip={"placement": "bottom", "always_visible": True}),
+        ]
+
+    return dbc.Form(options)
+
+def make_layout(prefix: str, title: str, default_p: Optional[float]) -> Callable[..., html.Div]:
+    def layout(**kwargs) -> html.Div:
+        """
+        The layout of a simulation page. Both the base graph and the options
+        are read from the global state here, so that pages opened after the
+        graph changes show the new graph.
+        """
+        return html.Div(
+            [
+                html.H1(title),
+                dbc.Row(
+                    [
+                        dbc.Col(
+                            [
+                                html.B("Network"),
+                                dbc.Tabs(
+                                    [
+                                        dbc.Tab(
+                                            dbc.Spinner(dcc.Graph(id=f"graph-{prefix}-base", figure=dict(global_state.BASE_FIG_JSON))),
+                                            label="Base graph"
+                                        ),
+                                        dbc.Tab(
+                                            [
+                                                dbc.Spinner(dcc.Graph(id=f"graph-{prefix}-new"))
+                                            ],
+                                            label="Reconstructed path to attackers"
+                                        )
+                                    ],
+                                    id=f"tabs-{prefix}"
+                                ),
+                                dcc.Store(id=f"store-{prefix}-colors"),
+                            ],
+                            width=12,
+                            xxl=8,
+                        ),
+                        dbc.Col(
+                            [
+                                dbc.Row(
+                                    [
+                                        dbc.Col(
+                                            [
+                                                html.B("Options"),
+                                                html.Div(generate_options(prefix, default_p))
+                                            ],
+                                            width=12,
+                                        ),
+                                        dbc.Col(
+                                            [
+                                                html.B("Results"),
+                                                dbc.Spinner(id=f"{prefix}-results")
+                                            ],
+                                            width=12
+                                        )
+                                    ]
+                                ),
+                            ],
+                            width=12,
+                            xxl=4,
+                        ),
+                    ]
+                ),
+            ]
+        )
+
+    return layout
+
+def register_page(
+    module: str,
+    prefix: str,
+    name: str,
+    order: int,
+    render: Renderer,
+    default_p: Optional[float] = None,
+    **kwargs,
+) -> Callable:
+    """
+    Register a simulation page, along with its callbacks.
+
+    :param module: The `__name__` of the page module.
+    :param prefix: The prefix used in the ids of the page's components.
+    :param name: The name of the page, shown as its title and in the sidebar.
+    :param order: The position of the page in the sidebar.
+    :param render: Draws the reconstructed paths on a copy of the base figure,
+        and builds the results.
+    :param default_p: The initial marking probability. If `None`, the page has
+        no marking probability option, and every router marks every packet.
+    :param kwargs: Passed on to `dash.register_page`.
+    :return: The page's simulation callback.
+    """
+    dash.register_page(
+        module,
+        name=name,
+        group="Simulations",
+        order=order,
+        layout=make_layout(prefix, name, default_p),
+        **kwargs,
+    )
+
+    # The base graph is recolored in the browser, so that only the node values
+    # are sent back rather than a second copy of the figure.
+    dash.clientside_callback(
+        graph_utils.COLOR_NODES_BY_PROPERTY_JS,
+        Output(f"graph-{prefix}-base", "figure"),
+        Input(f"store-{prefix}-colors", "data"),
+        State(f"graph-{prefix}-base", "figure"),
+    )
+
+    inputs = [
+        Input(f"slider-{prefix}-victim", 'value'),
+        Input(f"dropdown-{prefix}-attackers", 'value'),
+        Input(f"slider-{prefix}-packets", 'value'),
+    ]
+    if default_p is not None:
+        inputs.append(Input(f"slider-{prefix}-p", 'value'))
+
+    @callback(
+        Output(f"store-{prefix}-colors", "data"),
+        Output(f"graph-{prefix}-new", "figure"),
+        Output(f"{prefix}-results", "children"),
+        *inputs,
+    )
+    def update_output(
+        victim_node: int,
+        attackers: list[int],
+        packets: int,
+        p: float = 1,
+    ) -> Tuple[
+        Union[dict, dash.NoUpdate],
+        plotly.graph_objs.Figure,
+        list
+    ]:
+        # Default to at least two attackers, even if none is defined.
+        if not attackers:
+            attackers = [0, 1]
+
+        # Cast all attackers to integers, in case they were sent as strings.
+        attackers = [int(x) for x in attackers]
+
+        if victim_node in attackers:
+            attackers.remove(victim_node)
+
+        # Carry out the simulation. The global graph isn't modified by this, so
+        # there's no need to copy it.
+        #
+        # The simulation is seeded from everything except the marking
+        # probability. The attacker chosen for each packet (and so the number
+        # of times each node is used) then doesn't depend on p, and moving
+        # only the p slider changes which routers are marked, nothing else.
+        result = simul_utils.simulate_transmissions(
+            global_state.GRAPH,
+            victim_node,
+            attackers,
+            p,
+            packets,
+            paths=global_state.attack_paths(victim_node, attackers),
+            seed=(victim_node, packets, *sorted(attackers)),
+        )
+
+        # Color the base graph based on the simulation results (in the
+        # browser), and let the page build everything else. If only p
+        # changed, the base graph's colors are already up to date.
+        colors: Union[dict, dash.NoUpdate]
+        if ctx.triggered_id == f"slider-{prefix}-p":
+            colors = dash.no_update
+        else:
+            colors = {"property": "times_used", "values": result.times_used.tolist()}
+        fig_2, res_layout = render(
+            global_state.base_figure(), result, victim_node, attackers
+        )
+
+        return colors, fig_2, res_layout
+
+    return update_output
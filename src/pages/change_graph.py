@@ -1,3 +1,5 @@
+import functools
+
 import dash
 import dash_bootstrap_components as dbc
 from dash import html, dcc, callback, Input, Output, State
@@ -14,16 +16,43 @@ logger = logging.getLogger(__name__)
 dash.register_page(__name__, name="Change graph", group="Options", order=3)
 
 def generate_options():
+    # The form only depends on the active graph's parameters, so reuse it
+    # until they change.
+    params = global_state.GRAPH_PARAMETERS
+    return _build_options(params.n, params.k, params.p, params.layout, params.seed)
+
+@functools.lru_cache(maxsize=16)
+def _build_options(n: int, k: int, p: float, layout: str, seed: int) -> dbc.Form:
     return dbc.Form(
         [
             dbc.Label("Number of nodes (n)", html_for="slider-options-nodes"),   
-            dcc.Slider(5, 200, 1, value=global_state.GRAPH_PARAMETERS.n, id='slider-options-nodes', marks=None, tooltip={"placement": "bottom", "always_visible": True}),
+            dcc.Slider(5, 200, 1, value=n, id='slider-options-nodes', marks=None, tooltip={"placement": "bottom", "always_visible": True}),
             dbc.Label("Minimum neighbors per node (k)", html_for="slider-options-neighbors"),   
-            dcc.Slider(2, 10, 1, value=global_state.GRAPH_PARAMETERS.k, id='slider-options-neighbors', marks=None, tooltip={"placement": "bottom", "always_visible": True}),
+            dcc.Slider(2, 10, 1, value=k, id='slider-options-neighbors', marks=None, tooltip={"placement": "bottom", "always_visible": True}),
             dbc.Label("Probability of connection (p)", html_for="slider-options-probability"),   
-            dcc.Slider(0, 1, 0.01, value=global_state.GRAPH_PARAMETERS.p, id='slider-options-probability', marks=None, tooltip={"placement": "bottom", "always_visible": True}),
+            dcc.Slider(0, 1, 0.01, value=p, id='slider-options-probability', marks=None, tooltip={"placement": "bottom", "always_visible": True}),
+            dbc.Label("Layout", html_for="radio-options-layout"),
+            dbc.RadioItems(
+                options=[
+                    {"label": "Circular", "value": "circular"},
+                    {"label": "Spring (force-directed)", "value": "spring"},
+                ],
+                value=layout,
+                id="radio-options-layout",
+                inline=True,
+                style={"margin-bottom": "10px"},
+            ),
+            dbc.Label("Seed", html_for="input-options-seed"),
+            dbc.Input(
+                type="number",
+                min=0,
+                step=1,
+                value=seed,
+                id="input-options-seed",
+                style={"margin-bottom": "10px"},
+            ),
             dbc.Button(
-                "Generate new graph",
+                "Generate graph",
                 id="button-change-graph",
                 style={"margin-bottom": "10px"},
                 n_clicks=0
@@ -31,46 +60,46 @@ def generate_options():
         ]
     )
 
-layout = html.Div(
-    [
-        html.H1("Change graph"),
-        dbc.Row(
-            [
-                dbc.Col(
-                    [
-                        html.P(
-                            "Use this form to change the graph used across all"
-                            " pages. The generated graph will be a Watts-Strogatz"
-                            " small world graph based on the parameters provided"
-                            " below."
-                        ),
-                        html.B("Current network"),
-                        dbc.Spinner(dcc.Graph(id="graph-options", figure=global_state.FIGURE)),
-                    ],
-                    width=12,
-                    xxl=8,
-                ),
-                dbc.Col(
-                    [
-                        html.B("Graph options"),
-                        html.Div(generate_options(), "change-options-dummy")
-                    ],
-                    width=12,
-                    xxl=4,
-                ),
-            ]
-        ),
-    ]
-)
-
-figure = graph_utils.color_nodes_by_adjacency(global_state.GRAPH, global_state.FIGURE)
+def layout(**kwargs) -> html.Div:
+    """
+    Build the page layout. Dash calls this on every navigation to the page, so
+    the options always reflect the current global graph.
+    """
+    return html.Div(
+        [
+            html.H1("Change graph"),
+            dbc.Row(
+                [
+                    dbc.Col(
+                        [
+                            html.P(
+                                "Use this form to change the graph used across all"
+                                " pages. The generated graph will be a Watts-Strogatz"
+                                " small world graph based on the parameters provided"
+                                " below. The same parameters always generate"
+                                " the same graph; change the seed to generate a"
+                                " different one."
+                            ),
+                            html.B("Current network"),
+                            dbc.Spinner(dcc.Graph(id="graph-options", figure=figure)),
+                        ],
+                        width=12,
+                        xxl=8,
+                    ),
+                    dbc.Col(
+                        [
+                            html.B("Graph options"),
+                            html.Div(generate_options())
+                        ],
+                        width=12,
+                        xxl=4,
+                    ),
+                ]
+            ),
+        ]
+    )
 
-@callback(
-    Output("change-options-dummy", "children"),
-    Input("change-options-dummy", "children")
-)
-def update_dummy(_):
-    return generate_options()
+figure = graph_utils.color_nodes_by_adjacency(global_state.GRAPH, global_state.base_figure())
 
 @callback(
     Output("graph-options", "figure"),
@@ -78,9 +107,11 @@ def update_dummy(_):
     State('slider-options-nodes', 'value'),
     State('slider-options-neighbors', 'value'),
     State('slider-options-probability', 'value'),
+    State('radio-options-layout', 'value'),
+    State('input-options-seed', 'value'),
     prevent_inital_call=True
 )
-def update_graph(clicks, n, k, p) -> plotly.graph_objs.Figure:
+def update_graph(clicks, n, k, p, layout, seed) -> plotly.graph_objs.Figure:
     global cur_clicks, figure
     # If the button hasn't actually been pressed, do nothing. This counter seems
     # to reset each time the page is accesssed.
@@ -90,7 +121,8 @@ def update_graph(clicks, n, k, p) -> plotly.graph_objs.Figure:
         cur_clicks = clicks
     
     # Generate new graph based on parameters and update the global state
-    figure = global_state.update_global_state(n, k, p)
+    # The seed is left empty if the field is cleared.
+    figure = global_state.update_global_state(n, k, p, layout, int(seed or 0))
     figure = graph_utils.color_nodes_by_adjacency(global_state.GRAPH, figure)
     
     return figure
\ No newline at end of file
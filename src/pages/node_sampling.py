@@ -1,161 +1,43 @@
 from textwrap import dedent
-import copy
 
-from dash import html, Input, Output, callback, dcc
-from typing import Callable, Tuple
-import pandas as pd
+from dash import dcc
+from typing import Tuple
+import numpy as np
 import dash
 import dash_bootstrap_components as dbc
-import plotly.graph_objects as go
-import networkx as nx
 import plotly
 
 import graph_utils
 import simul_utils
 import global_state
+from pages import _sampling_factory
 
-# This is registered as the homepage with path `/`, else accessing the server
-# yields a 404 until you click on one of the pages
-dash.register_page(__name__, name="Node sampling", group="Simulations", order=1)
 
-def generate_options():
-    # Regenerate this every time the page is loaded
-    
-    return dbc.Form(
-        [
-            dbc.Label("Packets to send", html_for="slider-nsample-packets"),   
-            dcc.Slider(0, 5000, 10, value=100, id='slider-nsample-packets', marks=None, tooltip={"placement": "bottom", "always_visible": True}),
-            dbc.Label("Index of victim node", html_for="slider-nsample-victim"),   
-            dcc.Slider(0, global_state.GRAPH_PARAMETERS.n-1, 1, value=0, id='slider-nsample-victim', marks=None, tooltip={"placement": "bottom", "always_visible": True}),
-            dbc.Label("Indices of attackers", html_for="dropdown-nsample-attackers"), 
-            dcc.Dropdown(
-            {str(i): i for i in range(global_state.GRAPH_PARAMETERS.n)},
-            ['1'],
-            multi=True,
-            id="dropdown-nsample-attackers"
-            ),
-            dbc.Label("Marking probability (p)", html_for="slider-nsample-p"),   
-            dcc.Slider(0, 1, 0.01, value=0.5, id='slider-nsample-p', marks=None, tooltip={"placement": "bottom", "always_visible": True}),
-        ]
-    )
-
-layout = html.Div(
-    [
-        html.H1("Node sampling"),
-        dbc.Row(
-            [
-                dbc.Col(
-                    [
-                        html.B("Network"),
-                        dbc.Tabs(
-                            [
-                                dbc.Tab(
-                                    dbc.Spinner(dcc.Graph(id="graph-nsample-base")),
-                                    label="Base graph"
-                                ),
-                                dbc.Tab(
-                                    [
-                                        dbc.Spinner(dcc.Graph(id="graph-nsample-new"))
-                                    ],
-                                    label="Reconstructed path to attackers"
-                                )
-                            ],
-                            id="tabs-nsample"
-                        )
-                    ],
-                    width=12,
-                    xxl=8,
-                ),
-                dbc.Col(
-                    [
-                        dbc.Row(
-                            [
-                                dbc.Col(
-                                    [
-                                        html.B("Options"),
-                                        html.Div(generate_options(), id="nsample-options-dummy")
-                                    ],
-                                    width=12,
-                                    #style={"height": "50vh"}
-                                ),
-                                dbc.Col(
-                                    [
-                                        html.B("Results"),
-                                        dbc.Spinner(id="nsample-results")
-                                    ],
-                                    width=12
-                                    
-                                )                                
-                            ]
-                        ),
-                    ],
-                    width=12,
-                    xxl=4,
-                ),
-            ]
-        ),
-    ]
-)
-
-@callback(
-    Output("nsample-options-dummy", "children"),
-    Input("nsample-options-dummy", "children")
-)
-def update_dummy(_):
-    return generate_options()
-
-@callback(
-    Output("graph-nsample-base", "figure"),
-    Output("graph-nsample-new", "figure"),
-    Output("nsample-results", "children"),
-    Input("slider-nsample-victim", 'value'),
-    Input("dropdown-nsample-attackers", 'value'),
-    Input("slider-nsample-packets", 'value'),
-    Input("slider-nsample-p", 'value')
-)
-def update_output(
-    victim_node: int, 
-    attackers: list[str],
-    packets: int,
-    p
+def render_results(
+    fig_2: plotly.graph_objs.Figure,
+    result: simul_utils.SimulationResult,
+    victim_node: int,
+    attackers: list[int],
 ) -> Tuple[
     plotly.graph_objs.Figure,
-    plotly.graph_objs.Figure,
-    str
+    list
 ]:
-    # Default to at least two attackers, even if none is defined.
-    if not attackers:
-        attackers = ["0", "1"]
-
-    # Cast all attackers to integers.
-    attackers = [int(x) for x in attackers]
-    
-    if victim_node in attackers:
-        attackers.remove(victim_node)
-
-    # Copy the global figure.
-    fig = copy.deepcopy(global_state.FIGURE)
-    
-    # Create a copy of the global graph. This allows attributes to be reused,
-    # since all of our attributes are not containers (and therefore are properly
-    # copied with new references).
-    graph = global_state.GRAPH.copy()
-    
-    # Carry out the simulation.
-    result = simul_utils.simulate_transmissions(graph, victim_node, attackers, p, packets)
-    
-    # Color the copy of the figure based on the simulation results.
-    fig = graph_utils.color_nodes_by_property(result.graph, fig, "times_used")
-    fig_2 = copy.deepcopy(fig)
-    fig_2 = graph_utils.color_nodes_by_property(result.graph, fig_2, "times_marked")
-    fig_2 = graph_utils.rebuild_node_sampling_paths(result.graph, fig_2, victim_node, global_state.POSITIONS)
+    fig_2 = graph_utils.color_nodes_by_property(fig_2, "times_marked", result.times_marked)
+    fig_2 = graph_utils.rebuild_node_sampling_paths(fig_2, victim_node, global_state.POSITIONS, result.times_marked)
     
     # Spit out the simulation results. Select only the node ID and the times
-    # it was marked in a packet.
-    df = pd.DataFrame.from_dict(dict(result.graph.nodes(data=True)), orient='index')
-    df['node_id'] = df.index
-    df = df[['node_id', 'times_marked', 'times_used']]
-    df = df.sort_values("times_marked", ascending=False)
+    # it was marked in a packet, most marked first. The counters are already
+    # indexed by node, so the table rows come straight from them.
+    columns = ["node_id", "times_marked", "times_used"]
+    order = np.argsort(-result.times_marked, kind="stable")
+    records = [
+        {"node_id": i, "times_marked": m, "times_used": u}
+        for i, m, u in zip(
+            order.tolist(),
+            result.times_marked[order].tolist(),
+            result.times_used[order].tolist(),
+        )
+    ]
     
     md_str = dedent(
         f"""
@@ -171,9 +53,12 @@ def update_output(
     res_layout = [
         dcc.Markdown(md_str),
         dbc.Container(
-            dash.dash_table.DataTable(df.to_dict('records'), [{"name": i, "id": i} for i in df.columns], sort_action='native'), 
+            dash.dash_table.DataTable(records, [{"name": i, "id": i} for i in columns], sort_action='native'), 
             style={"height": "25vh", "overflow": "scroll"})
     ]
     
-    
-    return fig, fig_2, res_layout
\ No newline at end of file
+    return fig_2, res_layout
+
+update_output = _sampling_factory.register_page(
+    __name__, "nsample", name="Node sampling", order=1, render=render_results, default_p=0.5
+)
@@ -3,18 +3,36 @@ Utility functions for performing simulations.
 """
 
 import networkx as nx
-import random
+import numba
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
 import logging
 from dataclasses import dataclass
-from typing import Union, Tuple
+from typing import Optional, Sequence, Union, Tuple
 
 logger = logging.getLogger(__name__)
 
 @dataclass
 class SimulationResult:
-    # The graph itself, with nodes annotated
+    # The graph the simulation was run on. This is *not* annotated or otherwise
+    # modified by the simulation; the counters below are kept alongside it.
     graph: nx.Graph
     
+    # Per-node counters, indexed by node.
+    # - `times_used` is the number of packets that passed through this node.
+    # - `times_marked` is the number of packets this node was sampled into.
+    times_used: np.ndarray
+    times_marked: np.ndarray
+    
+    # The edges of the graph, as an (m, 2) array with the smaller node first,
+    # in the order of `graph.edges()`.
+    edges: np.ndarray
+    
+    # Per-edge counters, indexed by the edge's row in `edges`.
+    edge_times_used: np.ndarray
+    edge_times_marked: np.ndarray
+    
     # Overall statistics
     packets_sent: int
     intermediate_routers: int
@@ -34,84 +52,148 @@ class SimulationResult:
     nsample_overhead: int  # == packets_sent * 4
     esample_overhead: int  # == packets_sent * 9
     
-def initialize_graph(
-    graph: nx.Graph
-) -> nx.Graph:
-    """
-    Return an initialized graph for simulation.
-
-    If the graph is undirected, the graph is converted to a digraph.
-    The original graph is not modified.
+@dataclass
+class AttackPaths:
+    # The edges of the graph, as from `edge_index`.
+    edges: np.ndarray
+    
+    # The shortest path from each attacker to the target, from the attacker
+    # (first) to the target (last), stored back to back. The path of the i-th
+    # attacker is `paths_flat[paths_offsets[i]:paths_offsets[i + 1]]`.
+    paths_flat: np.ndarray
+    paths_offsets: np.ndarray
+    
+    # Parallel to `paths_flat`: the index of the edge from each node on a path
+    # to the next node on that path (-1 for the target at the end of a path).
+    edge_lookup_flat: np.ndarray
 
-    :param graph: The graph to initialize.
+def edge_index(graph: nx.Graph) -> tuple[np.ndarray, scipy.sparse.csr_array]:
     """
-    # Create copy of incoming graph
-    G = graph.copy()
-
-    # If the graph is undirected, make it a directed graph with edges
-    # in both directions (i.e. the graph is functionally the same)
-    # if isinstance(G, nx.Graph):
-    #     G = G.to_directed()
-
-    # Initialize node attributes.
-    # - `times_sampled` is the number of times this node was 
-    # - `times_used` is the number of packets that passed through this router.
-    nx.set_node_attributes(G, 0, "times_marked")
-    nx.set_node_attributes(G, 0, "times_used")
-    nx.set_edge_attributes(G, 0, "times_marked")
-    nx.set_edge_attributes(G, 0, "times_used")
-
-    return G
+    Number the edges of `graph`.
+    
+    Returns an (m, 2) array of edges, with the smaller node first, and a CSR
+    adjacency whose `data` holds the index of each entry's edge in that array,
+    plus one. Both directions of an edge map to the same index.
+    
+    The offset keeps every stored entry nonzero, so that edge 0 isn't an
+    explicit zero (which `eliminate_zeros()` would drop), and so that looking
+    up a pair of nodes that aren't adjacent gives -1 rather than edge 0.
+    """
+    n = graph.number_of_nodes()
+    edges = np.sort(
+        np.array(list(graph.edges()), dtype=np.int64).reshape(-1, 2), axis=1
+    )
+    edge_ids = np.arange(1, len(edges) + 1)
+    
+    adj = scipy.sparse.csr_array(
+        (
+            np.concatenate([edge_ids, edge_ids]),
+            (
+                np.concatenate([edges[:, 0], edges[:, 1]]),
+                np.concatenate([edges[:, 1], edges[:, 0]]),
+            ),
+        ),
+        shape=(n, n),
+    )
+    return edges, adj
 
-def simulate_transmissions(
-    graph: nx.Graph, 
-    target_node: int, 
+def shortest_paths(
+    graph: nx.Graph,
+    target_node: int,
     attacking_nodes: list[int],
-    p: float,
-    num_packets: int,
-) -> SimulationResult:
+    index: Optional[tuple[np.ndarray, scipy.sparse.csr_array]] = None,
+) -> AttackPaths:
     """
-    Simulate a DDoS attack, in which multiple nodes all send traffic to a single
-    target node.
-    
-    This collects data need for computing all traceback algorithms, as well as
-    specific data associated with each traceback algorithm.
+    Find the shortest path from each attacker to the target.
     
-    The graph is modified in place; that is, each node is given a new attribute
-    containing relevant data for the simulation.
+    In our case, we're always going to use the shortest path by distance,
+    which is not necessarily true of real networks. However, this makes the
+    outcome of the simulation a lot clearer, since the network conditions
+    aren't changing halfway through.
     
-    :param graph: The graph to perform the simulation on.
+    :param graph: The graph to find paths in. Nodes must be labeled with the
+        integers `0..n-1`.
     :param target_node: The index of the node that all traffic is directed towards.
     :param attacking_nodes: A nonempty list of node indexes that are the source
         of traffic directed at the target node.
-    :param p: The probability that an edge or node is marked as part of their
-        respective sampling algorithms.
-    :param packets_to_send: The number of packets to send over all the nodes.
-    :param payload_size: The TCP payload size of the "packets".
+    :param index: The result of `edge_index(graph)`, if already known.
     """
-    logger.info(f"Starting simulation ({target_node=}, {attacking_nodes=}, {p=}, {num_packets=})")
+    if not attacking_nodes:
+        raise ValueError("At least one attacking node is required")
     
-    # Clamp p to [0, 1]
-    p = max(0, min(p, 1))
+    edges, adj = index if index is not None else edge_index(graph)
     
-    # Initialize graph with required attributes
-    graph = initialize_graph(graph)
+    # Since every packet goes to the same target, a single BFS from the target
+    # gives the shortest path from every attacker: `parent[v]` is the next hop
+    # from `v` towards the target (negative for the target itself, and for
+    # unreachable nodes). The adjacency already holds both directions of each
+    # edge, so it can be searched as-is rather than symmetrized again.
+    _, parent = scipy.sparse.csgraph.breadth_first_order(
+        adj, target_node, directed=True, return_predecessors=True
+    )
     
-    nappend_overhead = 0
-    intermediate_routers = 0
-    for _ in range(num_packets):
-        # Select a random attacker node, then calculate a path from the attacker
-        # node to the target node. In our case, we're always going to use the
-        # shortest path by distance, which is not necessarily true of real 
-        # networks. However, this makes the outcome of the simulation a lot
-        # clearer, since the network conditions aren't changing halfway through.
-        attacker_node = random.choice(attacking_nodes)
-        path = nx.shortest_path(graph, attacker_node, target_node)
+    path_nodes: list[int] = []
+    paths_offsets = [0]
+    for attacker_node in attacking_nodes:
+        if attacker_node != target_node and parent[attacker_node] < 0:
+            raise ValueError("The target node is unreachable from an attacker")
         
-        # logger.info(f"Path selected: {path}")
+        node = attacker_node
+        path_nodes.append(node)
+        while node != target_node:
+            node = int(parent[node])
+            path_nodes.append(node)
+        paths_offsets.append(len(path_nodes))
+    
+    # Look up the index of the edge to the next hop from the adjacency, whose
+    # values are edge indices plus one.
+    paths_flat = np.array(path_nodes, dtype=np.int32)
+    edge_lookup_flat = np.full(len(paths_flat), -1, dtype=np.int64)
+    hops = paths_flat != target_node
+    edge_lookup_flat[hops] = adj[paths_flat[hops], parent[paths_flat[hops]]] - 1
+    if (edge_lookup_flat[hops] < 0).any():
+        raise ValueError("The index doesn't match the graph")
+    
+    return AttackPaths(
+        edges=edges,
+        paths_flat=paths_flat,
+        paths_offsets=np.array(paths_offsets, dtype=np.int64),
+        edge_lookup_flat=edge_lookup_flat,
+    )
+
+@numba.njit(cache=True)
+def _simulate_core(
+    paths_flat: np.ndarray,
+    paths_offsets: np.ndarray,
+    attacker_choices: np.ndarray,
+    rand_vals: np.ndarray,
+    p: float,
+    times_used: np.ndarray,
+    times_marked: np.ndarray,
+    edge_times_used: np.ndarray,
+    edge_times_marked: np.ndarray,
+    edge_lookup_flat: np.ndarray,
+) -> int:
+    """
+    The packet loop of `simulate_transmissions`.
+    
+    The path of attacker `i` is `paths_flat[paths_offsets[i]:paths_offsets[i + 1]]`,
+    and `edge_lookup_flat[k]` is the index of the edge from `paths_flat[k]` to
+    the next node on its path.
+    Each packet is sent by the attacker `attacker_choices[j]`, and `rand_vals`
+    holds one draw for each router of each packet, in order. The counters are
+    incremented in place.
+    
+    Returns the total number of intermediate routers.
+    """
+    intermediate_routers = 0
+    r = 0
+    for attacker in attacker_choices:
+        start = paths_offsets[attacker]
+        end = paths_offsets[attacker + 1]
         
         # Increment the count for the attacker node itself.
-        graph.nodes[attacker_node]["times_used"] += 1
+        times_used[paths_flat[start]] += 1
         
         # Treat all nodes except the first and last nodes as routers. Evaluate 
         # the sampling algorithms at each router.
@@ -119,55 +201,127 @@ def simulate_transmissions(
         # For the purposes of sampling, we have complete knowledge of the entire
         # graph, so it's fine to just save the router that's decided to write
         # itself into the associated packet field. For node sampling, this
-        # value is precisely what we want.
-        #
-        # For edge sampling, we simply search for the index of this router in
-        # the path. The number of elements after that router, minus one, is the
-        # distance of the "edge" from the victim (as described by the algorithm).
+        # value is precisely what we want. For edge sampling, the marked edge is
+        # the one from that router to the next hop on the path.
         #
         # Because Dijkstra's/shortest path is deterministic for our graph, saving
         # the relevant nodes is sufficient to determine the would-be edges in
         # all cases.
-        saved_router: int | None = None
-        
-        for idx, node in enumerate(path[1:-1], 0):
-            # yes, all redundant, but a little nicer
-            graph.nodes[node]["times_used"] += 1
-            graph.edges[path[idx], path[idx+1]]["times_used"] += 1
+        saved = -1
+        for idx in range(start + 1, end - 1):
+            times_used[paths_flat[idx]] += 1
+            edge_times_used[edge_lookup_flat[idx - 1]] += 1
             intermediate_routers += 1
             
             # Test if sampling applies to this node.
-            x = random.random()
-            if x < p:
-                saved_router = node
-                
-            # Add this router to the "overhead", a 32-bit address.
-            nappend_overhead += 4
-            
+            if rand_vals[r] < p:
+                saved = idx
+            r += 1
+        
         # When the victim receives the packet, increment the number of times
         # that router has been marked. Again, for shortest path, there will
         # only be one edge out of this node that is the shortest path to 
         # the victim, so there's no need to save it here.
-        if saved_router is not None:
-            graph.nodes[saved_router]["times_marked"] += 1
-            
-            path_idx = path.index(saved_router)
-            graph.edges[path[path_idx], path[path_idx+1]]["times_marked"] += 1
-        
-        # TODO: Because we won't have any weird cyclic routing, it will *never*
-        # be the case that the saved distance d != the actual distance from a
-        # saved edge. There's no need to save the distance, and the actual path
-        # reconstructed will simply be all the nodes with a nonzero mark count,
-        # plus the victim themselves. 
-        #
-        # For visual clarity, we will also add the attacker nodes.
-        
+        if saved != -1:
+            times_marked[paths_flat[saved]] += 1
+            edge_times_marked[edge_lookup_flat[saved]] += 1
+    
+    return intermediate_routers
+
+def simulate_transmissions(
+    graph: nx.Graph, 
+    target_node: int, 
+    attacking_nodes: list[int],
+    p: float,
+    num_packets: int,
+    paths: Optional[AttackPaths] = None,
+    seed: Optional[Union[int, Sequence[int]]] = None,
+) -> SimulationResult:
+    """
+    Simulate a DDoS attack, in which multiple nodes all send traffic to a single
+    target node.
+    
+    This collects data need for computing all traceback algorithms, as well as
+    specific data associated with each traceback algorithm.
+    
+    The graph is not modified. Instead, the number of times each node and edge
+    was used or marked is returned in the counters of the `SimulationResult`,
+    so the shared global graph can be passed in directly without copying it.
+    The packets themselves are simulated in a compiled kernel
+    (`_simulate_core`), with all random numbers drawn up front.
+    
+    :param graph: The graph to perform the simulation on. Nodes must be labeled
+        with the integers `0..n-1`.
+    :param target_node: The index of the node that all traffic is directed towards.
+    :param attacking_nodes: A nonempty list of node indexes that are the source
+        of traffic directed at the target node.
+    :param p: The probability that an edge or node is marked as part of their
+        respective sampling algorithms.
+    :param packets_to_send: The number of packets to send over all the nodes.
+    :param payload_size: The TCP payload size of the "packets".
+    :param paths: The result of `shortest_paths` for the same graph, target
+        and attackers, if already known.
+    :param seed: The seed for the simulation's random numbers, either an int or
+        a sequence of ints (anything `np.random.default_rng` accepts). The same
+        seed and arguments always give the same result.
+    """
+    logger.info(f"Starting simulation ({target_node=}, {attacking_nodes=}, {p=}, {num_packets=})")
+    
+    # Clamp p to [0, 1]
+    p = max(0, min(p, 1))
+    
+    if paths is None:
+        paths = shortest_paths(graph, target_node, attacking_nodes)
+    
+    n = graph.number_of_nodes()
+    edges = paths.edges
+    
+    # Select a random attacker for each packet, and draw one sample for each
+    # router of each packet. All of the simulation's randomness comes from this
+    # one generator.
+    rng = np.random.default_rng(seed)
+    attacker_choices = rng.integers(0, len(paths.paths_offsets) - 1, num_packets)
+    router_counts = np.maximum(np.diff(paths.paths_offsets) - 2, 0)
+    rand_vals = rng.random(int(router_counts[attacker_choices].sum()))
+    
+    # Initialize the counters for this simulation.
+    times_used = np.zeros(n, dtype=np.int64)
+    times_marked = np.zeros(n, dtype=np.int64)
+    edge_times_used = np.zeros(len(edges), dtype=np.int64)
+    edge_times_marked = np.zeros(len(edges), dtype=np.int64)
+    
+    intermediate_routers = _simulate_core(
+        paths.paths_flat,
+        paths.paths_offsets,
+        attacker_choices,
+        rand_vals,
+        p,
+        times_used,
+        times_marked,
+        edge_times_used,
+        edge_times_marked,
+        paths.edge_lookup_flat,
+    )
+    
+    # TODO: Because we won't have any weird cyclic routing, it will *never*
+    # be the case that the saved distance d != the actual distance from a
+    # saved edge. There's no need to save the distance, and the actual path
+    # reconstructed will simply be all the nodes with a nonzero mark count,
+    # plus the victim themselves. 
+    #
+    # For visual clarity, we will also add the attacker nodes.
+    
     return SimulationResult(
         graph=graph,
+        times_used=times_used,
+        times_marked=times_marked,
+        edges=edges,
+        edge_times_used=edge_times_used,
+        edge_times_marked=edge_times_marked,
         packets_sent=num_packets,
         intermediate_routers=intermediate_routers,
-        nappend_overhead=nappend_overhead,
+        # Each router adds itself to the "overhead", a 32-bit address.
+        nappend_overhead=intermediate_routers*4,
         nsample_overhead=num_packets*4,
         esample_overhead=num_packets*9
     )
-        
\ No newline at end of file